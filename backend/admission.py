@@ -0,0 +1,231 @@
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Client-side timeouts from frontend/src/services/api.js, minus a safety margin
+VOICE_CLIENT_TIMEOUT_SECONDS = float(os.getenv("VOICE_CLIENT_TIMEOUT_SECONDS", "55"))
+TEXT_CLIENT_TIMEOUT_SECONDS = float(os.getenv("TEXT_CLIENT_TIMEOUT_SECONDS", "25"))
+
+# How often a queued request re-checks whether its client has given up
+_POLL_SECONDS = 0.25
+_SERVICE_SMOOTHING = 0.2
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be served before its deadline"""
+
+    def __init__(self, stage, retry_after):
+        super().__init__(f"{stage} stage is overloaded")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class ClientGone(Exception):
+    """Raised when the client's deadline passed while work was still pending"""
+
+    def __init__(self, stage):
+        super().__init__(f"Client deadline passed before {stage} stage")
+        self.stage = stage
+
+
+def deadline_after(seconds):
+    """Absolute monotonic deadline for a client timeout in seconds"""
+    return time.monotonic() + seconds
+
+
+def deadline_passed(deadline):
+    """True once the client has stopped waiting; None means no deadline"""
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def check_deadline(deadline, stage):
+    """Raise ClientGone, counted against stage, if the client has stopped waiting"""
+    if deadline_passed(deadline):
+        stage.abandon()
+        raise ClientGone(stage.name)
+
+
+class Stage:
+    """
+    A bounded pipeline stage: at most `concurrency` requests run at once and
+    at most `max_queue` wait for a slot. Service time per unit of cost is
+    tracked as an exponentially weighted average and used to estimate
+    queueing delay. Cost defaults to one unit per request; stages whose work
+    varies with input size (e.g. seconds of audio for STT) pass their own.
+    """
+
+    def __init__(self, name, concurrency, max_queue, initial_service_seconds):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.avg_service_seconds = initial_service_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self._in_flight_cost = 0.0
+        self._waiting_cost = 0.0
+        self.rejected = 0
+        self.abandoned = 0
+        self.completed = 0
+        self._slots = threading.Semaphore(concurrency)
+        self._lock = threading.Lock()
+
+    def depth(self):
+        """Requests currently running or waiting in this stage"""
+        with self._lock:
+            return self.in_flight + self.waiting
+
+    def expected_wait(self):
+        """Estimated seconds before a newly arriving request starts running"""
+        with self._lock:
+            return self._expected_wait_locked()
+
+    def _expected_wait_locked(self):
+        if self.in_flight + self.waiting < self.concurrency:
+            return 0.0
+        # Work already admitted, shared across the slots
+        queued_cost = self._in_flight_cost + self._waiting_cost
+        return queued_cost / self.concurrency * self.avg_service_seconds
+
+    def _queue_full_locked(self):
+        # The queue limit only matters once every slot is busy
+        return self.in_flight >= self.concurrency and self.waiting >= self.max_queue
+
+    def _retry_after_locked(self):
+        return max(1, int(math.ceil(self._expected_wait_locked())))
+
+    def abandon(self):
+        """Count work dropped because its client stopped waiting"""
+        with self._lock:
+            self.abandoned += 1
+
+    def acquire(self, deadline, cost=1.0):
+        """
+        Wait for a slot, raising Overloaded if the queue is full or the
+        expected wait runs past the deadline, and ClientGone if the deadline
+        passes while queued. A deadline of None never expires.
+        """
+        with self._lock:
+            # A client that already gave up is abandoned work, not shed load
+            if deadline_passed(deadline):
+                self.abandoned += 1
+                raise ClientGone(self.name)
+            finish_estimate = (time.monotonic() + self._expected_wait_locked()
+                               + cost * self.avg_service_seconds)
+            if self._queue_full_locked() or (deadline is not None and finish_estimate > deadline):
+                self.rejected += 1
+                raise Overloaded(self.name, self._retry_after_locked())
+            self.waiting += 1
+            self._waiting_cost += cost
+
+        try:
+            while not self._slots.acquire(timeout=_POLL_SECONDS):
+                if deadline_passed(deadline):
+                    with self._lock:
+                        self.abandoned += 1
+                    raise ClientGone(self.name)
+        finally:
+            with self._lock:
+                self.waiting -= 1
+                self._waiting_cost -= cost
+
+        with self._lock:
+            self.in_flight += 1
+            self._in_flight_cost += cost
+        return time.monotonic()
+
+    def try_acquire(self, cost=1.0):
+        """Take a slot only if one is free right now, for optional work"""
+        if not self._slots.acquire(blocking=False):
+            return None
+        with self._lock:
+            self.in_flight += 1
+            self._in_flight_cost += cost
+        return time.monotonic()
+
+    def release(self, started_at, cost=1.0):
+        """Free a slot taken by acquire or try_acquire with the same cost"""
+        elapsed = time.monotonic() - started_at
+        with self._lock:
+            self.in_flight -= 1
+            self._in_flight_cost -= cost
+            self.completed += 1
+            if cost > 0:
+                per_unit = elapsed / cost
+                self.avg_service_seconds += _SERVICE_SMOOTHING * (per_unit - self.avg_service_seconds)
+        self._slots.release()
+
+    @contextmanager
+    def slot(self, deadline, cost=1.0):
+        """Context manager around acquire/release"""
+        started_at = self.acquire(deadline, cost)
+        try:
+            yield
+        finally:
+            self.release(started_at, cost)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "avg_service_seconds": self.avg_service_seconds,
+                "expected_wait_seconds": self._expected_wait_locked(),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "abandoned": self.abandoned
+            }
+
+
+# STT cost is measured in seconds of audio, so its service time is per audio second
+stt_stage = Stage(
+    "stt",
+    concurrency=int(os.getenv("STT_CONCURRENCY", "2")),
+    max_queue=int(os.getenv("STT_MAX_QUEUE", "8")),
+    initial_service_seconds=float(os.getenv("STT_SECONDS_PER_AUDIO_SECOND", "0.5"))
+)
+llm_stage = Stage(
+    "llm",
+    concurrency=int(os.getenv("LLM_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    initial_service_seconds=float(os.getenv("LLM_EXPECTED_SECONDS", "1.5"))
+)
+tts_stage = Stage(
+    "tts",
+    concurrency=int(os.getenv("TTS_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("TTS_MAX_QUEUE", "16")),
+    initial_service_seconds=float(os.getenv("TTS_EXPECTED_SECONDS", "1.5"))
+)
+
+
+def admit(stages, deadline, costs=None):
+    """
+    Reject a request up front if running every stage in order is expected
+    to take longer than the time left before its deadline. costs maps a
+    stage name to this request's cost there (default one unit).
+    """
+    costs = costs or {}
+    expected = 0.0
+    retry_after = 1
+    for stage in stages:
+        with stage._lock:
+            wait = stage._expected_wait_locked()
+            expected += wait + costs.get(stage.name, 1.0) * stage.avg_service_seconds
+            retry_after = max(retry_after, stage._retry_after_locked())
+            full = stage._queue_full_locked()
+
+        if full or time.monotonic() + expected > deadline:
+            with stage._lock:
+                stage.rejected += 1
+            raise Overloaded(stage.name, retry_after)
+
+
+def get_admission_stats():
+    """Snapshot of per-stage queue and concurrency counters"""
+    return {stage.name: stage.stats() for stage in (stt_stage, llm_stage, tts_stage)}
@@ -13,9 +13,15 @@ import traceback
 
 # Import our modules
 try:
-    from chat_groq import ask_groq, test_groq_connection
+    from chat_groq import ask_groq, test_groq_connection, get_route_stats
     from tts_gtts import text_to_speech, text_to_speech_bytes, cleanup_temp_files
-    from stt_vosk import transcribe_audio_file, simple_transcribe
+    from stt_vosk import transcribe_audio_file, simple_transcribe, get_stt_stats, get_audio_duration
+    from speculative_llm import SpeculativeAsk, get_speculative_stats
+    from admission import (
+        Overloaded, ClientGone, admit, check_deadline, deadline_after,
+        stt_stage, llm_stage, tts_stage, get_admission_stats,
+        VOICE_CLIENT_TIMEOUT_SECONDS, TEXT_CLIENT_TIMEOUT_SECONDS
+    )
 except ImportError as e:
     print(f"Import error: {e}")
     print("Traceback:", traceback.format_exc())
@@ -37,10 +43,28 @@ conversation_sessions = {}
 # Allowed file extensions - now includes all common audio formats
 ALLOWED_EXTENSIONS = {'wav', 'mp3', 'ogg', 'webm', 'm4a', 'mp4', 'aac', 'flac', 'opus'}
 
+# 16 kHz 16-bit mono, used to estimate clip length from upload size at admission
+WAV_BYTES_PER_SECOND = 16000 * 2
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def overloaded_response(error):
+    """503 with Retry-After for requests shed by admission control"""
+    print(f"Load shedding: {error}")
+    response = jsonify({
+        "error": "Server is busy. Please try again shortly.",
+        "retry_after": error.retry_after
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
+def client_gone_response(error):
+    """Response for work abandoned after the client's timeout passed"""
+    print(f"Abandoned request: {error}")
+    return jsonify({"error": "Request timed out"}), 504
+
 @app.route('/')
 def home():
     return jsonify({
@@ -74,7 +98,10 @@ def health_check():
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Text-based chat endpoint"""
+    deadline = deadline_after(TEXT_CLIENT_TIMEOUT_SECONDS)
     try:
+        admit([llm_stage], deadline)
+        
         data = request.get_json()
         if not data:
             return jsonify({"error": "Invalid JSON data"}), 400
@@ -89,7 +116,8 @@ def chat():
         history = conversation_sessions.get(session_id, [])
         
         # Get AI response
-        ai_response = ask_groq(user_message, history)
+        with llm_stage.slot(deadline):
+            ai_response = ask_groq(user_message, history, channel="text")
         
         # Validate response
         if ai_response is None:
@@ -119,6 +147,10 @@ def chat():
             "session_id": session_id
         })
     
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientGone as e:
+        return client_gone_response(e)
     except Exception as e:
         print(f"Error in chat endpoint: {e}")
         return jsonify({"error": f"Internal server error: {str(e)}"}), 500
@@ -127,8 +159,16 @@ def chat():
 def voice_chat():
     """Voice-based chat endpoint"""
     temp_audio_path = None  # Initialize to ensure it's available in error handling
+    speculative = None
+    deadline = deadline_after(VOICE_CLIENT_TIMEOUT_SECONDS)
     try:
+        # Shed load before reading the upload body. STT cost is seconds of
+        # audio, estimated from the upload size until the file is parsed.
+        estimated_seconds = (request.content_length or 0) / float(WAV_BYTES_PER_SECOND)
+        admit([stt_stage, llm_stage, tts_stage], deadline, costs={stt_stage.name: estimated_seconds})
+        
         session_id = request.form.get('session_id', 'default')
+        quality = request.form.get('quality')  # Optional "fast" or "accurate" STT hint
         
         # Check if audio file was uploaded
         if 'audio' not in request.files:
@@ -147,8 +187,25 @@ def voice_chat():
         temp_audio_path = os.path.join(tempfile.gettempdir(), f"upload_{uuid.uuid4().hex}_{filename}")
         audio_file.save(temp_audio_path)
         
-        # Transcribe audio to text
-        user_message = transcribe_audio_file(temp_audio_path)
+        # Get conversation history
+        history = conversation_sessions.get(session_id, [])
+        
+        # Transcribe audio to text, speculatively asking Groq once the
+        # partial transcript is stable
+        speculative = SpeculativeAsk(history, stage=llm_stage, deadline=deadline)
+        audio_seconds = get_audio_duration(temp_audio_path) or 0.0
+        with stt_stage.slot(deadline, cost=audio_seconds):
+            try:
+                user_message = transcribe_audio_file(
+                    temp_audio_path,
+                    on_partial=speculative.feed,
+                    quality=quality,
+                    queue_depth=lambda: stt_stage.depth() - 1,
+                    deadline=deadline
+                )
+            except ClientGone:
+                stt_stage.abandon()
+                raise
         
         # Check for transcription errors
         if not user_message or user_message.startswith("Error"):
@@ -156,18 +213,17 @@ def voice_chat():
             # Fallback for development
             user_message = "I said something but the transcription isn't working yet."
         
-        # Get conversation history
-        history = conversation_sessions.get(session_id, [])
-        
-        # Get AI response
-        ai_response = ask_groq(user_message, history)
+        # Get AI response (reuses the speculative result if it matches)
+        check_deadline(deadline, llm_stage)
+        ai_response = speculative.resolve(user_message)
         
         # Validate response
         if ai_response is None:
             return jsonify({"error": "Failed to get AI response"}), 500
         
         # Generate TTS audio for AI response
-        tts_audio_bytes = text_to_speech_bytes(ai_response)
+        with tts_stage.slot(deadline):
+            tts_audio_bytes = text_to_speech_bytes(ai_response)
         
         # Create conversation exchange
         exchange = {
@@ -192,21 +248,32 @@ def voice_chat():
             "has_audio": tts_audio_bytes is not None
         })
     
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientGone as e:
+        return client_gone_response(e)
     except Exception as e:
         print(f"Error in voice chat endpoint: {e}")
-        # Ensure cleanup happens even if there's an error in the main try block
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+    finally:
+        # Drop any speculative Groq call still pending for this request
+        if speculative is not None:
+            speculative.cancel()
+        # Always remove the upload so shed and failed requests don't leak temp files
         if temp_audio_path and os.path.exists(temp_audio_path):
             try:
                 os.remove(temp_audio_path)
             except:
                 pass  # Ignore errors during cleanup
-        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
 
 @app.route('/api/tts', methods=['POST'])
 def get_tts_audio():
     """Get TTS audio for a given text"""
     temp_file_path = None  # Initialize to ensure it's available in error handling
+    deadline = deadline_after(TEXT_CLIENT_TIMEOUT_SECONDS)
     try:
+        admit([tts_stage], deadline)
+        
         data = request.get_json()
         if not data:
             return jsonify({"error": "Invalid JSON data"}), 400
@@ -217,7 +284,8 @@ def get_tts_audio():
             return jsonify({"error": "Text cannot be empty"}), 400
         
         # Generate TTS audio
-        audio_bytes = text_to_speech_bytes(text)
+        with tts_stage.slot(deadline):
+            audio_bytes = text_to_speech_bytes(text)
         
         if not audio_bytes:
             return jsonify({"error": "Failed to generate audio"}), 500
@@ -235,6 +303,10 @@ def get_tts_audio():
             download_name='response.mp3'
         )
     
+    except Overloaded as e:
+        return overloaded_response(e)
+    except ClientGone as e:
+        return client_gone_response(e)
     except Exception as e:
         print(f"Error in TTS endpoint: {e}")
         # Ensure cleanup happens even if there's an error
@@ -278,6 +350,23 @@ def clear_conversation(session_id):
         print(f"Error clearing conversation: {e}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/stats', methods=['GET'])
+def get_stats():
+    """Pipeline performance counters for tuning"""
+    try:
+        return jsonify({
+            "success": True,
+            "stt": get_stt_stats(),
+            "llm_routes": get_route_stats(),
+            "speculative_llm": get_speculative_stats(),
+            "admission": get_admission_stats(),
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        print(f"Error getting stats: {e}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/settings', methods=['POST'])
 def update_settings():
     """Update user settings (placeholder for future implementation)"""
@@ -317,11 +406,11 @@ if __name__ == '__main__':
     
     print("Server starting on http://localhost:5000")
     
-    # Check if model is available before starting server
+    # Check if models are available before starting server
     try:
-        from stt_vosk import get_model_instance
-        model = get_model_instance()  # This will trigger model download if needed
-        print("+ Vosk model loaded successfully")
+        from stt_vosk import load_enabled_models
+        tiers = load_enabled_models()  # This will trigger model download if needed
+        print(f"+ Vosk models loaded successfully: {', '.join(tiers)}")
     except Exception as e:
         print(f"- Error loading Vosk model: {e}")
         print("Model will be downloaded when first needed")
@@ -1,18 +1,123 @@
 from groq import Groq
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
 client = Groq(api_key=os.getenv("GROQ_API_KEY"))
 
-def ask_groq(prompt, conversation_history=None):
+DEFAULT_MODEL = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+LONG_PROMPT_MODEL = os.getenv("GROQ_LONG_PROMPT_MODEL", DEFAULT_MODEL)
+LONG_PROMPT_CHARS = int(os.getenv("GROQ_LONG_PROMPT_CHARS", "600"))
+# Above this smoothed time per generated token every route falls back to its
+# fast settings. Per-token time doesn't grow with reply length, so long text
+# replies don't push voice turns into degraded mode on their own.
+SLOW_SECONDS_PER_TOKEN = float(os.getenv("GROQ_SLOW_SECONDS_PER_TOKEN", "0.05"))
+# Short replies are mostly fixed overhead, so count at least this many tokens
+_MIN_TOKENS_PER_SAMPLE = 50
+
+VOICE_INSTRUCTIONS = (
+    "Your reply will be spoken aloud. Answer in one to three short sentences "
+    "of plain conversational text, without markdown, lists or code."
+)
+
+# Route name -> request settings. Voice replies are capped hard because every
+# extra token costs generation time and TTS time the listener never benefits from.
+ROUTES = {
+    "text": {"model": DEFAULT_MODEL, "max_tokens": 1024, "temperature": 0.7, "system": None},
+    "text_long": {"model": LONG_PROMPT_MODEL, "max_tokens": 2048, "temperature": 0.7, "system": None},
+    "text_degraded": {"model": DEFAULT_MODEL, "max_tokens": 512, "temperature": 0.7, "system": None},
+    "voice": {"model": DEFAULT_MODEL, "max_tokens": 200, "temperature": 0.6, "system": VOICE_INSTRUCTIONS},
+    "voice_degraded": {"model": DEFAULT_MODEL, "max_tokens": 120, "temperature": 0.6, "system": VOICE_INSTRUCTIONS},
+}
+
+# Exponentially weighted upstream seconds per token and per-route counters
+_LATENCY_SMOOTHING = 0.2
+_upstream_seconds_per_token = None
+_stats_lock = threading.Lock()
+_route_stats = {}
+
+def choose_route(prompt, channel="text"):
+    """
+    Pick a route name for a prompt based on channel ("text" or "voice"),
+    prompt length and recent upstream latency
+    """
+    degraded = (_upstream_seconds_per_token is not None
+                and _upstream_seconds_per_token > SLOW_SECONDS_PER_TOKEN)
+    
+    if channel == "voice":
+        return "voice_degraded" if degraded else "voice"
+    if degraded:
+        return "text_degraded"
+    if len(prompt) > LONG_PROMPT_CHARS:
+        return "text_long"
+    return "text"
+
+def _record_route(route_name, latency, usage=None, error=False):
+    global _upstream_seconds_per_token
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    with _stats_lock:
+        # Failed calls (often timeouts) count as a minimum-size sample so a
+        # struggling upstream still pushes routing into degraded mode
+        if error or completion_tokens:
+            per_token = latency / max(completion_tokens, _MIN_TOKENS_PER_SAMPLE)
+            if _upstream_seconds_per_token is None:
+                _upstream_seconds_per_token = per_token
+            else:
+                _upstream_seconds_per_token += _LATENCY_SMOOTHING * (per_token - _upstream_seconds_per_token)
+        
+        stats = _route_stats.setdefault(route_name, {
+            "requests": 0,
+            "errors": 0,
+            "total_latency_seconds": 0.0,
+            "max_latency_seconds": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0
+        })
+        stats["requests"] += 1
+        stats["total_latency_seconds"] += latency
+        stats["max_latency_seconds"] = max(stats["max_latency_seconds"], latency)
+        if error:
+            stats["errors"] += 1
+        if usage is not None:
+            stats["prompt_tokens"] += getattr(usage, "prompt_tokens", 0) or 0
+            stats["completion_tokens"] += completion_tokens
+
+def get_route_stats():
+    """Snapshot of per-route latency and token counters"""
+    with _stats_lock:
+        routes = {name: dict(stats) for name, stats in _route_stats.items()}
+        upstream_seconds_per_token = _upstream_seconds_per_token
+    
+    for stats in routes.values():
+        requests = stats["requests"]
+        stats["avg_latency_seconds"] = stats["total_latency_seconds"] / requests if requests else 0.0
+        stats["avg_completion_tokens"] = stats["completion_tokens"] / requests if requests else 0.0
+    
+    return {
+        "upstream_seconds_per_token": upstream_seconds_per_token,
+        "routes": routes
+    }
+
+def ask_groq(prompt, conversation_history=None, channel="text", record_stats=True):
     """
     Send a prompt to Groq's Llama-3 model and get a response
+
+    channel is "text" or "voice" and selects the model, token cap and
+    brevity instructions through choose_route. record_stats=False keeps
+    the call out of the routing statistics, e.g. for health checks.
     """
+    route_name = choose_route(prompt, channel)
+    route = ROUTES[route_name]
+    started = time.monotonic()
     try:
         messages = []
         
+        if route["system"]:
+            messages.append({"role": "system", "content": route["system"]})
+        
         # Add conversation history if provided
         if conversation_history:
             for exchange in conversation_history[-10:]:  # Keep last 10 exchanges
@@ -23,15 +128,19 @@ def ask_groq(prompt, conversation_history=None):
         messages.append({"role": "user", "content": prompt})
         
         response = client.chat.completions.create(
-            model="llama-3.1-8b-instant",
+            model=route["model"],
             messages=messages,
-            max_tokens=1024,
-            temperature=0.7
+            max_tokens=route["max_tokens"],
+            temperature=route["temperature"]
         )
         
+        if record_stats:
+            _record_route(route_name, time.monotonic() - started, getattr(response, "usage", None))
         return response.choices[0].message.content
     
     except Exception as e:
+        if record_stats:
+            _record_route(route_name, time.monotonic() - started, error=True)
         print(f"Error with Groq API: {e}")
         error_str = str(e)
         print(f"Full error details: {error_str}")
@@ -42,7 +151,7 @@ def ask_groq(prompt, conversation_history=None):
         elif "rate limit" in error_msg or "quota" in error_msg or "exceeded" in error_msg:
             return "Error: Rate limit exceeded. Please try again later or check your Groq API usage limits."
         elif "model" in error_msg or "not found" in error_msg or "does not exist" in error_msg:
-            return "Error: AI model not available. Please check if 'llama-3.1-8b-instant' model is available in your account."
+            return f"Error: AI model not available. Please check if '{route['model']}' model is available in your account."
         elif "connection" in error_msg or "timeout" in error_msg or "connect" in error_msg:
             return "Error: Cannot connect to Groq API. Please check your internet connection."
         else:
@@ -52,7 +161,7 @@ def test_groq_connection():
     """Test if Groq API is working"""
     try:
         # Use a simple test that won't consume many tokens
-        response = ask_groq("Hello")
+        response = ask_groq("Hello", record_stats=False)
         return True, response if response else "Connection OK"
     except Exception as e:
         print(f"Groq connection test failed: {e}")
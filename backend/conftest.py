@@ -0,0 +1,4 @@
+import os
+
+# chat_groq creates its client at import time; tests never reach the network
+os.environ.setdefault("GROQ_API_KEY", "test-key")
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dotenv import load_dotenv
+
+from chat_groq import ask_groq
+from admission import ClientGone
+
+load_dotenv()
+
+# Speculation is on by default; set SPECULATIVE_LLM=0 to disable it
+SPECULATIVE_ENABLED = os.getenv("SPECULATIVE_LLM", "1") not in ("0", "false", "False")
+
+# How long (in seconds of decoded audio) the partial transcript must stay
+# unchanged before a speculative Groq call is started
+STABLE_WINDOW_SECONDS = float(os.getenv("SPECULATIVE_STABLE_SECONDS", "0.6"))
+
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("SPECULATIVE_WORKERS", "4")),
+    thread_name_prefix="speculative-llm"
+)
+
+# Global hit/miss counters shared by all requests
+_stats_lock = threading.Lock()
+_stats = {
+    "started": 0,
+    "hits": 0,
+    "misses": 0,
+    "cancelled": 0,
+    "skipped_busy": 0,
+    "latency_saved_seconds": 0.0
+}
+
+
+def _normalize(text):
+    return " ".join((text or "").lower().split())
+
+
+def _record(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+class SpeculativeAsk:
+    """
+    Starts ask_groq on a partial transcript once it has been stable for
+    STABLE_WINDOW_SECONDS of audio, and reuses the result if the final
+    transcript matches.
+
+    Usage:
+        spec = SpeculativeAsk(history)
+        transcribe_audio_file(path, on_partial=spec.feed)
+        ai_response = spec.resolve(final_text)
+
+    If an admission Stage is given, speculative calls only run when it has
+    a free slot, and the fallback call waits for a slot until deadline.
+    Waiting for either call past the deadline raises ClientGone.
+    """
+
+    def __init__(self, conversation_history=None, stable_window=None, channel="voice",
+                 stage=None, deadline=None):
+        self.conversation_history = conversation_history
+        self.channel = channel
+        self.stage = stage
+        self.deadline = deadline
+        self._skipped_busy = False
+        self._speculated = False
+        self.stable_window = STABLE_WINDOW_SECONDS if stable_window is None else stable_window
+        self._candidate = ""
+        self._candidate_since = 0.0
+        self._prompt = None
+        self._future = None
+        self._call_started = None
+
+    def feed(self, text, audio_seconds):
+        """Callback for transcribe_audio_file partial updates"""
+        if not SPECULATIVE_ENABLED:
+            return
+
+        self._drop_skipped()
+
+        normalized = _normalize(text)
+        if normalized != self._candidate:
+            self._candidate = normalized
+            self._candidate_since = audio_seconds
+            # The transcript moved on, so any in-flight speculation is stale
+            if self._future is not None and normalized != self._prompt:
+                self.cancel()
+            return
+
+        if not normalized or self._future is not None:
+            return
+
+        if audio_seconds - self._candidate_since >= self.stable_window:
+            self._start(text)
+
+    def _start(self, text):
+        self._prompt = _normalize(text)
+        self._call_started = threading.Event()
+        self._future = _executor.submit(self._run, text, self._call_started)
+
+    def _drop_skipped(self):
+        """Forget a call that found no free LLM slot so a later window can retry"""
+        if self._future is not None and self._future.done() and not self._call_started.is_set():
+            self._future = None
+            self._prompt = None
+
+    def _run(self, text, call_started):
+        """
+        Returns (response, started_at, finished_at) so each call keeps its
+        own timing, or None if the LLM stage had no free slot
+        """
+        slot_started = None
+        if self.stage is not None:
+            # Speculation is optional work, so never queue for it. The slot
+            # is taken here rather than at submit time so jobs waiting for
+            # an executor thread don't hold LLM slots.
+            slot_started = self.stage.try_acquire()
+            if slot_started is None:
+                if not self._skipped_busy:
+                    self._skipped_busy = True
+                    _record(skipped_busy=1)
+                return None
+
+        call_started.set()
+        self._speculated = True
+        _record(started=1)
+        started_at = time.monotonic()
+        try:
+            response = ask_groq(text, self.conversation_history, channel=self.channel)
+            return response, started_at, time.monotonic()
+        finally:
+            if slot_started is not None:
+                self.stage.release(slot_started)
+
+    def cancel(self):
+        """
+        Drop the current speculative call. A call that has not started yet
+        is cancelled outright; one already in flight is left to finish and
+        its result is discarded.
+        """
+        if self._future is None:
+            return
+        # Calls skipped for lack of a slot never ran, so they aren't counted
+        if self._future.cancel() or self._call_started.is_set():
+            _record(cancelled=1)
+        self._future = None
+        self._prompt = None
+
+    def _wait(self, future):
+        """Wait for a speculative call, but not past the deadline"""
+        if self.deadline is None:
+            return future.result()
+        try:
+            return future.result(timeout=max(self.deadline - time.monotonic(), 0))
+        except FutureTimeoutError:
+            self.cancel()
+            if self.stage is None:
+                raise ClientGone("llm")
+            self.stage.abandon()
+            raise ClientGone(self.stage.name)
+
+    def resolve(self, final_text):
+        """
+        Return the AI response for final_text, reusing the speculative
+        result on a match and falling back to a fresh ask_groq otherwise.
+        """
+        if self._future is not None and self._prompt == _normalize(final_text):
+            resolved_at = time.monotonic()
+            try:
+                outcome = self._wait(self._future)
+            except ClientGone:
+                raise
+            except Exception as e:
+                print(f"Speculative Groq call failed: {e}")
+                outcome = None
+            self._future = None
+
+            # ask_groq reports failures as "Error: ..." replies rather than
+            # raising; those fall through to a fresh call
+            if outcome is not None and not outcome[0].startswith("Error:"):
+                response, started_at, finished_at = outcome
+                saved = min(finished_at, resolved_at) - started_at
+                _record(hits=1, latency_saved_seconds=max(saved, 0.0))
+                return response
+
+        if self._future is not None:
+            self.cancel()
+        if self._speculated:
+            _record(misses=1)
+
+        if self.stage is not None:
+            with self.stage.slot(self.deadline):
+                return ask_groq(final_text, self.conversation_history, channel=self.channel)
+        return ask_groq(final_text, self.conversation_history, channel=self.channel)
+
+
+def get_speculative_stats():
+    """Snapshot of speculative LLM hit/miss counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+
+    resolved = stats["hits"] + stats["misses"]
+    stats["enabled"] = SPECULATIVE_ENABLED
+    stats["stable_window_seconds"] = STABLE_WINDOW_SECONDS
+    stats["hit_rate"] = stats["hits"] / resolved if resolved else 0.0
+    stats["avg_latency_saved_seconds"] = (
+        stats["latency_saved_seconds"] / stats["hits"] if stats["hits"] else 0.0
+    )
+    return stats
@@ -5,15 +5,52 @@ import os
 import sys
 import subprocess
 import tempfile
+import threading
 
-# Global variable to store the model to avoid repeated downloads
-_model_instance = None
+from admission import ClientGone, deadline_passed
+
+# Available model tiers, fastest first. The large model is the default and
+# is always used when no other tier is configured.
+MODEL_TIERS = {
+    "small": "vosk-model-small-en-us-0.15",
+    "large": "vosk-model-en-us-0.22"
+}
+DEFAULT_TIER = "large"
+
+# Comma separated list of tiers to load, e.g. "small,large"
+ENABLED_TIERS = [
+    tier.strip() for tier in os.getenv("VOSK_MODEL_TIERS", DEFAULT_TIER).split(",")
+    if tier.strip() in MODEL_TIERS
+] or [DEFAULT_TIER]
+
+# Routing thresholds
+SHORT_AUDIO_SECONDS = float(os.getenv("VOSK_SHORT_AUDIO_SECONDS", "3.0"))
+BUSY_QUEUE_DEPTH = int(os.getenv("VOSK_BUSY_QUEUE_DEPTH", "2"))
+SECOND_PASS_CONFIDENCE = float(os.getenv("VOSK_SECOND_PASS_CONFIDENCE", "0.7"))
+
+# Global cache of loaded models, keyed by tier, to avoid repeated downloads
+# One lock per tier so loading one model never blocks requests for another
+_model_instances = {}
+_model_locks = {tier: threading.Lock() for tier in MODEL_TIERS}
+
+# Number of transcriptions currently running, used as the queue depth signal
+_active_transcriptions = 0
+_stats_lock = threading.Lock()
+_stats = {
+    "transcriptions": 0,
+    "second_passes": 0,
+    "second_passes_skipped_busy": 0,
+    "by_tier": {tier: 0 for tier in MODEL_TIERS}
+}
 
 # Download Vosk model if not exists
-def download_vosk_model():
-    model_path = "vosk-model-en-us-0.22"
+def download_vosk_model(model_name=MODEL_TIERS[DEFAULT_TIER]):
+    model_path = model_name
+    model_url = f"https://alphacephei.com/vosk/models/{model_name}.zip"
+    # Per-model archive name so concurrent downloads of different tiers don't collide
+    archive_path = f"{model_name}.zip"
     if not os.path.exists(model_path):
-        print("Downloading Vosk model...")
+        print(f"Downloading Vosk model {model_name}...")
         # For Windows, use PowerShell commands with error handling
         import platform
         if platform.system() == "Windows":
@@ -21,55 +58,96 @@ def download_vosk_model():
                 # Ensure we're using Windows PowerShell for compatibility
                 subprocess.run([
                     "powershell", "-Command", 
-                    "if (Get-Command Invoke-WebRequest -ErrorAction SilentlyContinue) { Invoke-WebRequest -Uri 'https://alphacephei.com/vosk/models/vosk-model-en-us-0.22.zip' -OutFile 'vosk-model.zip' } else { (New-Object System.Net.WebClient).DownloadFile('https://alphacephei.com/vosk/models/vosk-model-en-us-0.22.zip', 'vosk-model.zip') }"
+                    f"if (Get-Command Invoke-WebRequest -ErrorAction SilentlyContinue) {{ Invoke-WebRequest -Uri '{model_url}' -OutFile '{archive_path}' }} else {{ (New-Object System.Net.WebClient).DownloadFile('{model_url}', '{archive_path}') }}"
                 ], check=True)
-                subprocess.run(["powershell", "-Command", "Expand-Archive -Path 'vosk-model.zip' -DestinationPath '.'"], check=True)
-                subprocess.run(["powershell", "-Command", "Remove-Item 'vosk-model.zip'"], check=True)
+                subprocess.run(["powershell", "-Command", f"Expand-Archive -Path '{archive_path}' -DestinationPath '.'"], check=True)
+                subprocess.run(["powershell", "-Command", f"Remove-Item '{archive_path}'"], check=True)
             except subprocess.CalledProcessError:
                 print("PowerShell download failed, trying with urllib...")
                 # Fallback to Python download
                 import urllib.request
-                urllib.request.urlretrieve("https://alphacephei.com/vosk/models/vosk-model-en-us-0.22.zip", "vosk-model.zip")
+                urllib.request.urlretrieve(model_url, archive_path)
                 
                 # Extract using Python
                 import zipfile
-                with zipfile.ZipFile("vosk-model.zip", 'r') as zip_ref:
+                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
                     zip_ref.extractall(".")
                 
                 # Clean up
-                import os
-                os.remove("vosk-model.zip")
+                os.remove(archive_path)
         else:
             try:
                 subprocess.run([
                     "curl", "-L", 
-                    "https://alphacephei.com/vosk/models/vosk-model-en-us-0.22.zip",
-                    "-o", "vosk-model.zip"
+                    model_url,
+                    "-o", archive_path
                 ], check=True)
-                subprocess.run(["unzip", "vosk-model.zip"], check=True)
-                subprocess.run(["rm", "vosk-model.zip"], check=True)
+                subprocess.run(["unzip", archive_path], check=True)
+                subprocess.run(["rm", archive_path], check=True)
             except subprocess.CalledProcessError:
                 print("curl download failed, trying with urllib...")
                 import urllib.request
-                urllib.request.urlretrieve("https://alphacephei.com/vosk/models/vosk-model-en-us-0.22.zip", "vosk-model.zip")
+                urllib.request.urlretrieve(model_url, archive_path)
                 
                 import zipfile
-                with zipfile.ZipFile("vosk-model.zip", 'r') as zip_ref:
+                with zipfile.ZipFile(archive_path, 'r') as zip_ref:
                     zip_ref.extractall(".")
                 
-                import os
-                os.remove("vosk-model.zip")
+                os.remove(archive_path)
     return model_path
 
-def get_model_instance():
-    """Get or create a singleton model instance to avoid repeated downloads"""
-    global _model_instance
-    if _model_instance is None:
-        model_path = download_vosk_model()
-        if not os.path.exists(model_path):
-            raise Exception("Vosk model not found")
-        _model_instance = vosk.Model(model_path)
-    return _model_instance
+def get_model_instance(tier=DEFAULT_TIER):
+    """Get or create a cached model instance per tier to avoid repeated downloads"""
+    if tier not in MODEL_TIERS:
+        raise Exception(f"Unknown Vosk model tier: {tier}")
+    if tier in _model_instances:
+        return _model_instances[tier]
+    with _model_locks[tier]:
+        if tier not in _model_instances:
+            model_path = download_vosk_model(MODEL_TIERS[tier])
+            if not os.path.exists(model_path):
+                raise Exception("Vosk model not found")
+            _model_instances[tier] = vosk.Model(model_path)
+        return _model_instances[tier]
+
+def load_enabled_models():
+    """Load every configured tier up front"""
+    for tier in ENABLED_TIERS:
+        get_model_instance(tier)
+    return list(ENABLED_TIERS)
+
+def choose_model_tier(audio_seconds, quality=None, queue_depth=0):
+    """
+    Pick a model tier for a request.
+
+    quality may be "fast", "accurate" or None (automatic). Under load the
+    fastest tier is used regardless of the hint so throughput degrades
+    gracefully instead of requests queueing up behind the large model.
+    """
+    fastest = "small" if "small" in ENABLED_TIERS else ENABLED_TIERS[0]
+    best = DEFAULT_TIER if DEFAULT_TIER in ENABLED_TIERS else ENABLED_TIERS[-1]
+    
+    if queue_depth >= BUSY_QUEUE_DEPTH:
+        return fastest
+    if quality == "accurate":
+        return best
+    if quality == "fast" or audio_seconds <= SHORT_AUDIO_SECONDS:
+        return fastest
+    return best
+
+def _average_confidence(words):
+    """Mean per-word confidence from Vosk results, 1.0 if none reported"""
+    confidences = [word.get('conf', 1.0) for word in words]
+    return sum(confidences) / len(confidences) if confidences else 1.0
+
+def get_stt_stats():
+    """Snapshot of STT routing counters"""
+    with _stats_lock:
+        stats = dict(_stats)
+        stats["by_tier"] = dict(_stats["by_tier"])
+        stats["queue_depth"] = _active_transcriptions
+    stats["enabled_tiers"] = list(ENABLED_TIERS)
+    return stats
 
 def transcribe_audio(audio_data, sample_rate=16000):
     """
@@ -94,10 +172,71 @@ def transcribe_audio(audio_data, sample_rate=16000):
         print(f"Error in speech-to-text: {e}")
         return f"Error: Could not transcribe audio - {str(e)}"
 
-def transcribe_audio_file(file_path):
+def _decode_wave(wf, model, on_partial=None, deadline=None):
+    """
+    Run a wave file through a recognizer, returning the transcription and
+    its average word confidence. Raises ClientGone between chunks once
+    deadline has passed.
+    """
+    rec = vosk.KaldiRecognizer(model, wf.getframerate())
+    rec.SetWords(True)
+    
+    transcription = ""
+    words = []
+    frames_read = 0
+    while True:
+        if deadline_passed(deadline):
+            raise ClientGone("stt")
+        data = wf.readframes(4000)
+        if len(data) == 0:
+            break
+        frames_read += len(data) // wf.getsampwidth()
+        if rec.AcceptWaveform(data):
+            result = json.loads(rec.Result())
+            if result.get('text'):
+                transcription += result.get('text') + " "
+            words.extend(result.get('result', []))
+            running = transcription
+        elif on_partial:
+            partial_result = json.loads(rec.PartialResult())
+            running = transcription + partial_result.get('partial', '')
+        
+        if on_partial:
+            on_partial(running.strip(), frames_read / float(wf.getframerate()))
+    
+    # Get final result
+    final_result = json.loads(rec.FinalResult())
+    if final_result.get('text'):
+        transcription += final_result.get('text')
+    words.extend(final_result.get('result', []))
+    
+    return transcription, _average_confidence(words)
+
+def get_audio_duration(file_path):
+    """Length of a WAV file in seconds, or None if it can't be read as WAV"""
+    try:
+        wf = wave.open(file_path, 'rb')
+        try:
+            return wf.getnframes() / float(wf.getframerate())
+        finally:
+            wf.close()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+def transcribe_audio_file(file_path, on_partial=None, quality=None, queue_depth=None,
+                          deadline=None):
     """
     Transcribe audio from a file
+
+    If on_partial is given it is called after every chunk with the running
+    transcript (finished segments plus the current partial) and the amount
+    of audio decoded so far in seconds. quality is an optional "fast" or
+    "accurate" hint for choose_model_tier. queue_depth is an optional
+    callable returning how many other transcriptions are running or queued;
+    by default only the running ones in this process are counted. Decoding
+    stops with ClientGone once the monotonic deadline has passed.
     """
+    global _active_transcriptions
     try:
         # Check if file exists
         if not os.path.exists(file_path):
@@ -130,37 +269,60 @@ def transcribe_audio_file(file_path):
             wf.close()
             return "Error: Audio must be uncompressed. Please use an uncompressed WAV file."
         
-        # Use the singleton model instance with error handling
-        try:
-            model = get_model_instance()
-        except Exception as model_error:
-            print(f"Error loading Vosk model: {model_error}")
-            return f"Error: Failed to load speech recognition model - {str(model_error)}"
-        
-        rec = vosk.KaldiRecognizer(model, wf.getframerate())
-        rec.SetWords(True)
+        audio_seconds = wf.getnframes() / float(wf.getframerate())
         
-        transcription = ""
-        while True:
-            data = wf.readframes(4000)
-            if len(data) == 0:
-                break
-            if rec.AcceptWaveform(data):
-                result = json.loads(rec.Result())
-                if result.get('text'):
-                    transcription += result.get('text') + " "
+        with _stats_lock:
+            others_running = _active_transcriptions
+            _active_transcriptions += 1
         
-        # Get final result
-        final_result = json.loads(rec.FinalResult())
-        if final_result.get('text'):
-            transcription += final_result.get('text')
-        
-        wf.close()
+        try:
+            depth = queue_depth() if queue_depth else others_running
+            tier = choose_model_tier(audio_seconds, quality, depth)
+            
+            # Use the cached model instance with error handling
+            try:
+                model = get_model_instance(tier)
+            except Exception as model_error:
+                print(f"Error loading Vosk model: {model_error}")
+                return f"Error: Failed to load speech recognition model - {str(model_error)}"
+            
+            transcription, confidence = _decode_wave(wf, model, on_partial, deadline)
+            
+            with _stats_lock:
+                _stats["transcriptions"] += 1
+                _stats["by_tier"][tier] += 1
+                others_running = _active_transcriptions - 1
+            busy = (queue_depth() if queue_depth else others_running) >= BUSY_QUEUE_DEPTH
+            
+            # Re-run low confidence small-model results through the large
+            # model, unless the server is already busy
+            if tier != DEFAULT_TIER and DEFAULT_TIER in ENABLED_TIERS and confidence < SECOND_PASS_CONFIDENCE:
+                if busy:
+                    with _stats_lock:
+                        _stats["second_passes_skipped_busy"] += 1
+                else:
+                    # Keep the first-pass transcript if the large model fails
+                    try:
+                        wf.rewind()
+                        transcription, confidence = _decode_wave(wf, get_model_instance(DEFAULT_TIER), deadline=deadline)
+                        with _stats_lock:
+                            _stats["second_passes"] += 1
+                    except ClientGone:
+                        raise
+                    except Exception as e:
+                        print(f"Second pass with {DEFAULT_TIER} model failed: {e}")
+        finally:
+            with _stats_lock:
+                _active_transcriptions -= 1
+            wf.close()
         
         # Return the transcription or a default message if empty
         transcription = transcription.strip()
         return transcription if transcription else "I couldn't understand the audio clearly. Could you please repeat that?"
         
+    except ClientGone:
+        # Let the caller drop the request rather than report a transcription error
+        raise
     except wave.Error as e:
         print(f"Wave file error: {e}")
         return f"Error: Invalid WAV file format - {str(e)}"
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from admission import ClientGone, Overloaded, Stage, admit, check_deadline, deadline_after
+
+
+def test_free_stage_admits_and_releases():
+    stage = Stage("test", concurrency=2, max_queue=1, initial_service_seconds=1.0)
+    with stage.slot(deadline_after(10)):
+        assert stage.stats()["in_flight"] == 1
+    assert stage.stats()["in_flight"] == 0
+    assert stage.stats()["completed"] == 1
+
+
+def test_full_queue_is_rejected():
+    stage = Stage("test", concurrency=1, max_queue=0, initial_service_seconds=1.0)
+    started = stage.acquire(deadline_after(10))
+    with pytest.raises(Overloaded) as excinfo:
+        stage.acquire(deadline_after(10))
+    stage.release(started)
+
+    assert excinfo.value.retry_after >= 1
+    assert stage.stats()["rejected"] == 1
+
+
+def test_expected_wait_past_deadline_is_rejected():
+    stage = Stage("test", concurrency=1, max_queue=5, initial_service_seconds=5.0)
+    started = stage.acquire(deadline_after(30))
+    with pytest.raises(Overloaded):
+        stage.acquire(deadline_after(6))
+    stage.release(started)
+    assert stage.stats()["waiting"] == 0
+
+
+def test_expired_deadline_counts_as_abandoned():
+    stage = Stage("test", concurrency=1, max_queue=5, initial_service_seconds=5.0)
+    with pytest.raises(ClientGone):
+        stage.acquire(time.monotonic() - 1)
+
+    stats = stage.stats()
+    assert stats["abandoned"] == 1
+    assert stats["rejected"] == 0
+
+
+def test_queued_request_abandoned_at_deadline():
+    stage = Stage("test", concurrency=1, max_queue=5, initial_service_seconds=0.1)
+    started = stage.acquire(deadline_after(10))
+    with pytest.raises(ClientGone):
+        stage.acquire(deadline_after(0.3))
+    stage.release(started)
+    assert stage.stats()["abandoned"] == 1
+
+
+def test_try_acquire_never_queues():
+    stage = Stage("test", concurrency=1, max_queue=5, initial_service_seconds=1.0)
+    started = stage.try_acquire()
+    assert started is not None
+    assert stage.try_acquire() is None
+    stage.release(started)
+
+
+def test_admit_sums_stage_estimates():
+    stt = Stage("stt", concurrency=1, max_queue=5, initial_service_seconds=3.0)
+    llm = Stage("llm", concurrency=1, max_queue=5, initial_service_seconds=3.0)
+    admit([stt, llm], deadline_after(10))
+    with pytest.raises(Overloaded) as excinfo:
+        admit([stt, llm], deadline_after(5))
+    assert excinfo.value.stage == "llm"
+
+
+def test_cost_scales_estimates():
+    stt = Stage("stt", concurrency=1, max_queue=5, initial_service_seconds=0.5)
+    # 10 s of audio at 0.5 s per audio second fits; 500 s does not
+    admit([stt], deadline_after(55), costs={"stt": 10})
+    with pytest.raises(Overloaded):
+        admit([stt], deadline_after(55), costs={"stt": 500})
+
+    started = stt.acquire(deadline_after(55), cost=100)
+    assert stt.expected_wait() == pytest.approx(50)
+    with pytest.raises(Overloaded):
+        stt.acquire(deadline_after(55), cost=10)
+    stt.release(started, cost=100)
+    assert stt.expected_wait() == 0
+
+
+def test_no_deadline_never_expires():
+    stage = Stage("test", concurrency=1, max_queue=5, initial_service_seconds=100.0)
+    with stage.slot(None):
+        pass
+    assert stage.stats()["completed"] == 1
+
+
+def test_check_deadline_counts_abandoned():
+    stage = Stage("llm", concurrency=1, max_queue=5, initial_service_seconds=1.0)
+    check_deadline(deadline_after(10), stage)
+    with pytest.raises(ClientGone):
+        check_deadline(time.monotonic() - 1, stage)
+    assert stage.stats()["abandoned"] == 1
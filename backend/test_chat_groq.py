@@ -0,0 +1,77 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import chat_groq
+from chat_groq import ask_groq, choose_route
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(chat_groq, "_upstream_seconds_per_token", None)
+    monkeypatch.setattr(chat_groq, "_route_stats", {})
+    monkeypatch.setattr(chat_groq, "LONG_PROMPT_CHARS", 600)
+    monkeypatch.setattr(chat_groq, "SLOW_SECONDS_PER_TOKEN", 0.05)
+
+
+@pytest.fixture
+def fake_completion(monkeypatch):
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="Hi there"))],
+            usage=SimpleNamespace(prompt_tokens=12, completion_tokens=3)
+        )
+
+    monkeypatch.setattr(chat_groq.client.chat.completions, "create", create)
+    return requests
+
+
+def test_voice_and_text_routes():
+    assert choose_route("what's the weather", channel="voice") == "voice"
+    assert choose_route("what's the weather", channel="text") == "text"
+    assert choose_route("x" * 601, channel="text") == "text_long"
+    assert choose_route("x" * 601, channel="voice") == "voice"
+
+
+def test_slow_upstream_degrades_routes(monkeypatch):
+    monkeypatch.setattr(chat_groq, "_upstream_seconds_per_token", 0.2)
+    assert choose_route("hello", channel="voice") == "voice_degraded"
+    assert choose_route("x" * 601, channel="text") == "text_degraded"
+
+
+def test_long_healthy_reply_does_not_degrade_voice():
+    # 2000 tokens in 10 s is a healthy upstream even though the call was slow
+    chat_groq._record_route("text_long", 10.0, SimpleNamespace(prompt_tokens=50, completion_tokens=2000))
+    assert choose_route("hello", channel="voice") == "voice"
+
+
+def test_voice_request_uses_brief_settings(fake_completion):
+    assert ask_groq("tell me a story", channel="voice") == "Hi there"
+
+    sent = fake_completion[-1]
+    assert sent["max_tokens"] == chat_groq.ROUTES["voice"]["max_tokens"]
+    assert sent["messages"][0] == {"role": "system", "content": chat_groq.VOICE_INSTRUCTIONS}
+    assert chat_groq.get_route_stats()["routes"]["voice"]["completion_tokens"] == 3
+
+
+def test_health_ping_not_recorded(fake_completion):
+    ok, _ = chat_groq.test_groq_connection()
+    assert ok
+    assert chat_groq.get_route_stats() == {"upstream_seconds_per_token": None, "routes": {}}
+
+
+def test_failed_slow_calls_degrade_routes(monkeypatch):
+    def create(**kwargs):
+        time.sleep(0.2)
+        raise Exception("Request timed out")
+
+    monkeypatch.setattr(chat_groq.client.chat.completions, "create", create)
+    monkeypatch.setattr(chat_groq, "SLOW_SECONDS_PER_TOKEN", 0.001)
+
+    assert ask_groq("hello", channel="voice").startswith("Error:")
+    assert choose_route("hello", channel="voice") == "voice_degraded"
+    assert chat_groq.get_route_stats()["routes"]["voice"]["errors"] == 1
@@ -0,0 +1,192 @@
+import time
+
+import pytest
+
+import speculative_llm
+from admission import ClientGone, Stage, deadline_after
+from speculative_llm import SpeculativeAsk
+
+
+def _fake_ask(calls, delays=None):
+    def ask(prompt, conversation_history=None, channel="text"):
+        calls.append(prompt)
+        time.sleep((delays or {}).get(prompt, 0))
+        return f"reply to {prompt}"
+    return ask
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def _feed_stable(spec, text, start=0.0):
+    spec.feed(text, start)
+    spec.feed(text, start + spec.stable_window)
+
+
+def test_hit_reuses_speculative_result(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    _feed_stable(spec, "what time is it")
+    assert spec.resolve("What time is  it") == "reply to what time is it"
+
+    stats = speculative_llm.get_speculative_stats()
+    assert calls == ["what time is it"]
+    assert stats["hits"] == before["hits"] + 1
+    assert stats["misses"] == before["misses"]
+
+
+def test_miss_asks_again_with_final_text(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    _feed_stable(spec, "what time")
+    _wait_for(lambda: calls == ["what time"])
+    assert spec.resolve("what time is it in tokyo") == "reply to what time is it in tokyo"
+
+    stats = speculative_llm.get_speculative_stats()
+    assert calls[-1] == "what time is it in tokyo"
+    assert stats["misses"] == before["misses"] + 1
+    assert stats["hits"] == before["hits"]
+
+
+def test_unstable_partial_does_not_start(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    spec.feed("what", 0.0)
+    spec.feed("what time", 0.2)
+    spec.feed("what time", 0.4)
+    assert calls == []
+
+
+def test_changed_partial_cancels_speculation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    _feed_stable(spec, "play some")
+    spec.feed("play some jazz", 1.0)
+
+    stats = speculative_llm.get_speculative_stats()
+    assert stats["cancelled"] == before["cancelled"] + 1
+    assert spec._future is None
+
+
+def test_latency_saved_ignores_stale_call(monkeypatch):
+    calls = []
+    delays = {"play some": 0.5, "play some jazz": 0.05}
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls, delays))
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    _feed_stable(spec, "play some")
+    _wait_for(lambda: calls == ["play some"])  # stale call is in flight
+    spec.feed("play some jazz", 1.0)
+    spec.feed("play some jazz", 1.5)
+    time.sleep(0.6)  # let the stale call finish after the kept one
+    spec.resolve("play some jazz")
+
+    stats = speculative_llm.get_speculative_stats()
+    saved = stats["latency_saved_seconds"] - before["latency_saved_seconds"]
+    assert stats["hits"] == before["hits"] + 1
+    assert saved < 0.3
+
+
+def test_busy_stage_skips_speculation(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    stage = Stage("llm", concurrency=1, max_queue=5, initial_service_seconds=0.1)
+    held = stage.try_acquire()
+
+    spec = SpeculativeAsk(stable_window=0.5, stage=stage, deadline=deadline_after(10))
+    _feed_stable(spec, "what time is it")
+    spec._future.result()
+    stage.release(held)
+
+    assert calls == []
+    assert spec.resolve("what time is it") == "reply to what time is it"
+    assert stage.stats()["in_flight"] == 0
+
+
+def test_resolve_does_not_wait_past_deadline(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls, {"what time is it": 1.0}))
+
+    spec = SpeculativeAsk(stable_window=0.5, deadline=deadline_after(0.2))
+    _feed_stable(spec, "what time is it")
+    with pytest.raises(ClientGone):
+        spec.resolve("what time is it")
+    assert spec._future is None
+
+
+def test_error_reply_is_not_a_hit(monkeypatch):
+    calls = []
+
+    def ask(prompt, conversation_history=None, channel="text"):
+        calls.append(prompt)
+        if len(calls) == 1:
+            return "Error: Rate limit exceeded. Please try again later or check your Groq API usage limits."
+        return f"reply to {prompt}"
+
+    monkeypatch.setattr(speculative_llm, "ask_groq", ask)
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5)
+    _feed_stable(spec, "what time is it")
+    assert spec.resolve("what time is it") == "reply to what time is it"
+
+    stats = speculative_llm.get_speculative_stats()
+    assert len(calls) == 2
+    assert stats["hits"] == before["hits"]
+    assert stats["misses"] == before["misses"] + 1
+
+
+def test_busy_skip_retries_and_is_not_cancelled(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    stage = Stage("llm", concurrency=1, max_queue=5, initial_service_seconds=0.1)
+    held = stage.try_acquire()
+    before = speculative_llm.get_speculative_stats()
+
+    spec = SpeculativeAsk(stable_window=0.5, stage=stage, deadline=deadline_after(10))
+    _feed_stable(spec, "what time is it")
+    spec._future.result()
+    spec.feed("what time is it in tokyo", 1.0)  # skipped call must not count as cancelled
+    assert speculative_llm.get_speculative_stats()["cancelled"] == before["cancelled"]
+
+    stage.release(held)
+    spec.feed("what time is it in tokyo", 1.5)
+    assert spec.resolve("what time is it in tokyo") == "reply to what time is it in tokyo"
+    assert calls == ["what time is it in tokyo"]
+    assert speculative_llm.get_speculative_stats()["hits"] == before["hits"] + 1
+
+
+def test_stage_without_deadline_falls_back(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls))
+    stage = Stage("llm", concurrency=1, max_queue=5, initial_service_seconds=0.1)
+
+    spec = SpeculativeAsk(stable_window=0.5, stage=stage)
+    assert spec.resolve("hello") == "reply to hello"
+
+
+def test_timed_out_speculation_counts_abandoned(monkeypatch):
+    calls = []
+    monkeypatch.setattr(speculative_llm, "ask_groq", _fake_ask(calls, {"what time is it": 1.0}))
+    stage = Stage("llm", concurrency=2, max_queue=5, initial_service_seconds=0.1)
+
+    spec = SpeculativeAsk(stable_window=0.5, stage=stage, deadline=deadline_after(0.2))
+    _feed_stable(spec, "what time is it")
+    with pytest.raises(ClientGone):
+        spec.resolve("what time is it")
+    assert stage.stats()["abandoned"] == 1
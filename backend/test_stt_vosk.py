@@ -0,0 +1,111 @@
+import platform
+import time
+import wave
+
+import pytest
+
+import stt_vosk
+from admission import ClientGone
+from stt_vosk import choose_model_tier
+
+
+@pytest.fixture
+def both_tiers(monkeypatch):
+    monkeypatch.setattr(stt_vosk, "ENABLED_TIERS", ["small", "large"])
+    monkeypatch.setattr(stt_vosk, "SHORT_AUDIO_SECONDS", 3.0)
+    monkeypatch.setattr(stt_vosk, "BUSY_QUEUE_DEPTH", 2)
+
+
+def _write_wav(path, seconds=1.0, rate=16000):
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(rate)
+        wf.writeframes(b"\x00\x00" * int(seconds * rate))
+    return str(path)
+
+
+def test_short_audio_uses_small_model(both_tiers):
+    assert choose_model_tier(1.5) == "small"
+    assert choose_model_tier(8.0) == "large"
+
+
+def test_quality_hint_overrides_duration(both_tiers):
+    assert choose_model_tier(1.5, quality="accurate") == "large"
+    assert choose_model_tier(8.0, quality="fast") == "small"
+
+
+def test_busy_queue_forces_small_model(both_tiers):
+    assert choose_model_tier(8.0, quality="accurate", queue_depth=2) == "small"
+    assert choose_model_tier(8.0, quality="accurate", queue_depth=1) == "large"
+
+
+def test_only_large_enabled_always_large(monkeypatch):
+    monkeypatch.setattr(stt_vosk, "ENABLED_TIERS", ["large"])
+    assert choose_model_tier(0.5, quality="fast", queue_depth=10) == "large"
+
+
+def test_loading_one_tier_does_not_block_another(monkeypatch):
+    monkeypatch.setitem(stt_vosk._model_instances, "large", "large-model")
+    with stt_vosk._model_locks["small"]:
+        assert stt_vosk.get_model_instance("large") == "large-model"
+
+
+def test_failed_second_pass_keeps_first_transcript(both_tiers, monkeypatch, tmp_path):
+    def fake_model(tier="large"):
+        if tier == "large":
+            raise Exception("download failed")
+        return "small-model"
+
+    monkeypatch.setattr(stt_vosk, "get_model_instance", fake_model)
+    monkeypatch.setattr(stt_vosk, "_decode_wave", lambda wf, model, on_partial=None, deadline=None: ("turn on the lights", 0.2))
+
+    assert stt_vosk.transcribe_audio_file(_write_wav(tmp_path / "clip.wav")) == "turn on the lights"
+
+
+def test_downloads_use_per_model_archives(monkeypatch, tmp_path):
+    commands = []
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(platform, "system", lambda: "Linux")
+    monkeypatch.setattr(stt_vosk.subprocess, "run", lambda args, check: commands.append(args))
+
+    for model_name in stt_vosk.MODEL_TIERS.values():
+        stt_vosk.download_vosk_model(model_name)
+
+    archives = [args[-1] for args in commands if args[0] == "curl"]
+    assert archives == [f"{name}.zip" for name in stt_vosk.MODEL_TIERS.values()]
+
+
+class _FakeRecognizer:
+    def __init__(self, model, rate):
+        pass
+
+    def SetWords(self, enabled):
+        pass
+
+    def AcceptWaveform(self, data):
+        return False
+
+    def PartialResult(self):
+        return '{"partial": "turn on"}'
+
+    def FinalResult(self):
+        return '{"text": "turn on the lights"}'
+
+
+def test_decode_stops_at_deadline(monkeypatch, tmp_path):
+    monkeypatch.setattr(stt_vosk, "ENABLED_TIERS", ["large"])
+    monkeypatch.setattr(stt_vosk, "get_model_instance", lambda tier="large": "large-model")
+    monkeypatch.setattr(stt_vosk.vosk, "KaldiRecognizer", _FakeRecognizer)
+    path = _write_wav(tmp_path / "long.wav", seconds=5.0)
+
+    assert stt_vosk.transcribe_audio_file(path) == "turn on the lights"
+    with pytest.raises(ClientGone):
+        stt_vosk.transcribe_audio_file(path, deadline=time.monotonic() - 1)
+    assert stt_vosk.get_stt_stats()["queue_depth"] == 0
+
+
+def test_audio_duration(tmp_path):
+    assert stt_vosk.get_audio_duration(_write_wav(tmp_path / "clip.wav", seconds=2.0)) == 2.0
+    (tmp_path / "clip.webm").write_bytes(b"not a wav")
+    assert stt_vosk.get_audio_duration(str(tmp_path / "clip.webm")) is None